@@ -0,0 +1,22 @@
+import timeit
+
+from feature_infection import InfectionControl
+
+# Compare is_infected lookups with and without a lookup cache.  Every
+# lookup after the first is a cache hit.  Times are in microseconds per
+# call.
+def lookup_time(users, cache_size, repeats=200000):
+    control = InfectionControl(cache_size=cache_size)
+    control.infect("feature", *xrange(users))
+    for user in xrange(users):
+        control.has_infection(user, "feature")
+
+    lookup = lambda: control.has_infection(users // 2, "feature")
+    best = min(timeit.repeat(lookup, number=repeats, repeat=5))
+    return best * 1e6 / repeats
+
+if __name__ == "__main__":
+    print "users, uncached, cached"
+    for users in (10, 1000, 100000):
+        print ", ".join(map(str, (users, lookup_time(users, None),
+                                  lookup_time(users, 2 * users))))
@@ -1,6 +1,9 @@
 """Managing infections for deployments"""
 
+from . import columnar
 from . import subset_sum
+from .csr import CSRGraph
 from .infection import InfectionControl, Infector, CDC
 
-__all__ = ["InfectionControl", "Infector", "CDC", "subset_sum"]
+__all__ = ["InfectionControl", "Infector", "CDC", "CSRGraph", "columnar",
+           "subset_sum"]
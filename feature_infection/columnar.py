@@ -0,0 +1,93 @@
+"""
+Columnar Infection Format
+
+Compact binary layout for bulk transfer of infection state.
+
+A stream is a sequence of numpy .npy arrays.  The first two arrays hold
+the feature names as unicode and flags marking which names were UTF-8
+str, so both kinds of name are read back unchanged.  Each following
+chunk is a pair of arrays: an int64 column of infectable ids and a uint8
+matrix holding one packed bit column per feature, where bit j of row i
+is set when id j has feature i.  A chunk with no ids ends the stream.
+
+Exports:
+    id_column: convert ids to the id column of a chunk
+    write_features: start a stream with the feature names
+    write_chunk: append a chunk of ids and their infection bits
+    write_end: terminate a stream
+    read_chunks: iterate the features, ids and bits of a stream
+"""
+import numpy as np
+
+
+def id_column(ids):
+    """Convert a sequence of ids to an int64 column
+
+    Raises:
+        ValueError: an id is not an integer
+    """
+    column = np.asarray(ids)
+    if not column.size:
+        return column.astype(np.int64)
+    if column.ndim != 1 or column.dtype.kind not in "iu":
+        raise ValueError("columnar export requires integer ids")
+    return column.astype(np.int64)
+
+
+def write_features(fileobj, features):
+    """Start a stream listing the feature names of every bit column
+
+    Raises:
+        UnicodeDecodeError: a str feature name is not UTF-8.  Nothing
+            is written to fileobj.
+    """
+    encoded = [not isinstance(feature, unicode) for feature in features]
+    names = [feature.decode("utf-8") if is_encoded else feature
+             for feature, is_encoded in zip(features, encoded)]
+    names = np.array(names, dtype=np.unicode_)
+    np.save(fileobj, names)
+    np.save(fileobj, np.array(encoded, dtype=bool))
+
+
+def write_chunk(fileobj, ids, infected):
+    """Append a chunk of ids to a stream
+
+    Args:
+        fileobj: binary file to write to
+        ids: sequence of integer ids
+        infected: boolean matrix with a row per feature and a column
+            per id
+
+    Raises:
+        ValueError: an id is not an integer
+    """
+    column = id_column(ids)
+    if not len(column):
+        return
+    np.save(fileobj, column)
+    np.save(fileobj, np.packbits(infected, axis=1))
+
+
+def write_end(fileobj):
+    """Terminate a stream"""
+    np.save(fileobj, id_column([]))
+
+
+def read_chunks(fileobj):
+    """Iterate over the chunks of a stream
+
+    Yields:
+        list features * array ids * array infected: feature names,
+            ids of the chunk and the boolean matrix of their infections
+    """
+    names = np.load(fileobj).tolist()
+    encoded = np.load(fileobj).tolist()
+    features = [name.encode("utf-8") if is_encoded else name
+                for name, is_encoded in zip(names, encoded)]
+    while True:
+        ids = np.load(fileobj)
+        if not len(ids):
+            return
+        bits = np.load(fileobj)
+        infected = np.unpackbits(bits, axis=1).astype(bool)
+        yield features, ids, infected.take(np.arange(len(ids)), axis=1)
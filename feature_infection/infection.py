@@ -31,17 +31,100 @@ Glossary:
     infector - Label that can be used to infect an entity
     infectable - Entity that can be infected
 """
-from operator import itemgetter
+from operator import itemgetter, methodcaller
 from collections import defaultdict
+from itertools import count, ifilterfalse, imap, izip, repeat
 import logging
 
 import networkx as nx
+import numpy as np
+from . import columnar
 from . import subset_sum as ss
+from .csr import CSRGraph
 
 
 _LOG = logging.getLogger(__name__)
 
 
+class _Interner(object):
+    """Map infectables to integer ids
+
+    Infectables are hashed once, through id_key when provided, so that
+    later work can be done on compact ints instead of heavy objects.
+    Only keys are kept.  With an id_key the infectables themselves are
+    not held on to; without one each infectable is its own key.
+    """
+
+    def __init__(self, id_key=None):
+        """Create an empty interner keyed by id_key"""
+        self.id_key = id_key
+        self.ids = {}
+        self._next_id = 0
+
+    def key(self, infectable):
+        """Get the hashable key identifying an infectable"""
+        return self.id_key(infectable) if self.id_key else infectable
+
+    def intern(self, infectable):
+        """Get the id of an infectable, assigning the next id if new"""
+        return self.intern_key(self.key(infectable))
+
+    def intern_key(self, key):
+        """Get the id of a key, assigning the next id if new"""
+        ident = self.ids.get(key)
+        if ident is None:
+            ident = self.ids[key] = self._next_id
+            self._next_id += 1
+        return ident
+
+    def intern_keys(self, keys):
+        """Get the ids of a sequence of keys, assigning ids to new keys"""
+        new_keys = set(ifilterfalse(self.ids.__contains__, keys))
+        self.ids.update(izip(new_keys, count(self._next_id)))
+        self._next_id += len(new_keys)
+        return map(self.ids.__getitem__, keys)
+
+    def find(self, infectable):
+        """Get the id of an infectable or None if it was never interned"""
+        return self.ids.get(self.key(infectable))
+
+
+class _PlanInterner(_Interner):
+    """Interner that remembers the infectable behind each id of a plan"""
+
+    def __init__(self, id_key=None):
+        """Create an empty interner keyed by id_key"""
+        super(_PlanInterner, self).__init__(id_key)
+        self.objects = []
+
+    def intern(self, infectable):
+        """Get the id of an infectable, assigning the next id if new"""
+        key = self.key(infectable)
+        ident = self.ids.get(key)
+        if ident is None:
+            ident = self.intern_key(key)
+            self.objects.append(infectable)
+        return ident
+
+    def restore(self, idents):
+        """Map planned ids back to the infectables they represent"""
+        return set(self.objects[ident] for ident in idents)
+
+
+class _GraphNodes(object):
+    """Stand-in interner for a graph that is planned on as given"""
+
+    @staticmethod
+    def find(infectable):
+        """Graph nodes are their own ids"""
+        return infectable
+
+    @staticmethod
+    def restore(idents):
+        """Graph nodes are their own ids"""
+        return set(idents)
+
+
 class Infector(object):
     """Class representing a feature or other tag to apply to entities"""
 
@@ -51,19 +134,27 @@ class Infector(object):
         self.name = name
 
     @staticmethod
-    def _generate_graph(infectables, connections=iter):
-        """Convert a list of infectables into a graph via connections"""
+    def _generate_graph(infectables, interner, connections=iter):
+        """Convert a list of infectables into a graph of interned ids"""
+        if isinstance(infectables, nx.Graph):
+            infectables_graph = nx.Graph()
+            infectables_graph.add_nodes_from(
+                interner.intern(node) for node in infectables.nodes())
+            infectables_graph.add_edges_from(
+                (interner.intern(source), interner.intern(target))
+                for source, target in infectables.edges())
+            return infectables_graph
+
         if not callable(connections):
             raise ValueError("connections is not a function")
 
-        if isinstance(infectables, nx.Graph):
-            return infectables
-
         infectables_graph = nx.Graph()
         for infectable in infectables:
-            infectables_graph.add_node(infectable)
+            ident = interner.intern(infectable)
+            infectables_graph.add_node(ident)
             for connected_infectable in connections(infectable):
-                infectables_graph.add_edge(infectable, connected_infectable)
+                infectables_graph.add_edge(
+                    ident, interner.intern(connected_infectable))
         return infectables_graph
 
     @staticmethod
@@ -84,8 +175,28 @@ class Infector(object):
         infection_plan = set.union(*infected) if infected else set()
         return infection_plan
 
+    @staticmethod
+    def _get_csr_limited_infection_plan(infectables, target_size):
+        """Plan a limited infection from array backed component sizes"""
+        roots, sizes = infectables.component_sizes()
+        get_size = sizes.tolist().__getitem__
+        _, infection_groups = ss.optimize(range(len(roots)), target_size,
+                                          key=get_size)
+        return infectables.members(roots[infection_groups])
+
+    def _plan_graph(self, infectables_seq, connections, id_key):
+        """Get the graph to plan on and the interner of its nodes"""
+        id_key = id_key or self.control.id_key
+        if isinstance(infectables_seq, nx.Graph) and not id_key:
+            return infectables_seq, _GraphNodes()
+
+        interner = _PlanInterner(id_key)
+        infectables = self._generate_graph(infectables_seq, interner,
+                                           connections)
+        return infectables, interner
+
     def total_infection(self, infectables_seq, initial_infected,
-                        connections=None):
+                        connections=None, id_key=None):
         """Create an infection of all users connected to the target user.
 
         Starting at the root provided by initial_infected, infect all the
@@ -94,12 +205,16 @@ class Infector(object):
         Args:
             infectables_seq: list or graph of infectables.  If a list is
                 provided it will be converted to a graph with edges
-                defined by using the connections parmeter
+                defined by using the connections parmeter.  A CSRGraph
+                is planned on directly without conversion.
             inital_infected: infectable to form the root of the infection
             (optional) connections: function that produces adjacent
                 infectables for a given infectable.  The produced graph
                 is undirected but connections only is required to produce
                 adjecency in one direction.
+            (optional) id_key: function that produces a cheap hashable
+                identity for an infectable.  Defaults to the id_key of
+                the InfectionControl, or the infectable itself.
 
         Returns:
             set infected: returns a set of the infectables that were infected
@@ -110,13 +225,21 @@ class Infector(object):
         if not infectables_seq:
             return set()
 
-        infectables = self._generate_graph(infectables_seq, connections)
-        plan = self._get_total_infection_plan(infectables, initial_infected)
+        if isinstance(infectables_seq, CSRGraph):
+            plan = infectables_seq.component(initial_infected)
+            self.control.infect(self, *plan)
+            return plan
+
+        infectables, interner = self._plan_graph(infectables_seq,
+                                                 connections, id_key)
+        root = interner.find(initial_infected)
+        plan = interner.restore(
+            self._get_total_infection_plan(infectables, root))
         self.control.infect(self, *plan)
         return plan
 
     def limited_infection(self, infectables_seq, target_size,
-                          connections=None):
+                          connections=None, id_key=None):
         """Create an infection that is bounded by the target size
 
         Finds a subset of infectables that approximates as well as
@@ -130,12 +253,16 @@ class Infector(object):
         Args:
             infectables_seq: list or graph of infectables.  If a list is
                 provided it will be converted to a graph with edges
-                defined by using the connections parmeter
+                defined by using the connections parmeter.  A CSRGraph
+                is planned on directly without conversion.
             target_size: limit to the number of infected produced
             (optional) connections: function that produces adjacent
                 infectables for a given infectable.  The produced graph
                 is undirected but connections only is required to produce
                 adjecency in one direction.
+            (optional) id_key: function that produces a cheap hashable
+                identity for an infectable.  Defaults to the id_key of
+                the InfectionControl, or the infectable itself.
 
         Returns:
             set infected: returns a set of the infectables that were infected
@@ -146,8 +273,16 @@ class Infector(object):
         if not infectables_seq:
             return set()
 
-        infectables = self._generate_graph(infectables_seq, connections)
-        plan = self._get_limited_infection_plan(infectables, target_size)
+        if isinstance(infectables_seq, CSRGraph):
+            plan = self._get_csr_limited_infection_plan(infectables_seq,
+                                                        target_size)
+            self.control.infect(self, *plan)
+            return plan
+
+        infectables, interner = self._plan_graph(infectables_seq,
+                                                 connections, id_key)
+        plan = interner.restore(
+            self._get_limited_infection_plan(infectables, target_size))
         self.control.infect(self, *plan)
         return plan
 
@@ -155,14 +290,106 @@ class Infector(object):
         """Create an infection"""
         return self.control.has_infection(infectable, self)
 
+    def infected(self):
+        """Get the keys of every infectable with this feature"""
+        return self.control.infected(self)
+
+    def cure(self, infectables=None):
+        """Remove this feature from infectables, or from all when omitted"""
+        self.control.cure(self, infectables)
+
+
+class _LookupCache(object):
+    """Bounded cache of infection lookups tagged with a version
+
+    Lookups are kept in two plain dicts.  New lookups go into the recent
+    dict and when it fills it replaces the older dict, dropping whatever
+    the older dict held.  Hits on the older dict are promoted back to
+    the recent one, so eviction approximates least recently used without
+    reordering anything on a hit.
+
+    Entries recorded under an older version are treated as misses, so
+    bumping the version invalidates every cached lookup at once.
+
+    Against the in-memory infections a hit costs about the same as an
+    uncached lookup, around a microsecond, as both are dominated by the
+    has_infection call itself.  The cache pays off when infections are
+    held somewhere slower to query.
+    """
+
+    def __init__(self, size):
+        """Create a cache holding at most size lookups"""
+        self.capacity = max(1, size // 2)
+        self.hits = 0
+        self.misses = 0
+        self.recent = {}
+        self._older = {}
+
+    def get_older(self, key, version):
+        """Get a lookup missing from the recent dict, or None if absent
+
+        Callers check the recent dict themselves to keep hits cheap.
+        """
+        entry = self._older.get(key)
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+        self._store(key, entry)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, version, result):
+        """Record a lookup, evicting the older lookups if full"""
+        self._store(key, (version, result))
+
+    def _store(self, key, entry):
+        self.recent[key] = entry
+        if len(self.recent) >= self.capacity:
+            self._older = self.recent
+            self.recent = {}
+
 
 class InfectionControl(object):
     """Manage infections for a collection of objects"""
 
-    def __init__(self):
-        """Create an infection controller"""
+    def __init__(self, cache_size=None, id_key=None):
+        """Create an infection controller
+
+        Args:
+            (optional) cache_size: bound on the number of has_infection
+                lookups kept in an approximately least recently used
+                cache.  Caching is disabled when not provided.
+            (optional) id_key: function that produces a cheap hashable
+                identity for an infectable.  Infections are stored
+                against integer ids interned from this identity.
+                Defaults to the infectable itself.
+
+        The infections attribute maps those integer ids, not the
+        infectables, to the generation of each feature they were
+        infected with.  It no longer lists infectables; use infected,
+        has_infection or export_infections to read infections back.
+        """
         self.infectors = {}
-        self.infections = defaultdict(list)
+        self.infections = defaultdict(dict)
+        self.generations = defaultdict(int)
+        self._interner = _Interner(id_key)
+        self.version = 0
+        self._cache = _LookupCache(cache_size) if cache_size else None
+
+    @property
+    def id_key(self):
+        """Function producing the identity infections are stored under"""
+        return self._interner.id_key
+
+    @property
+    def cache_hits(self):
+        """Number of has_infection lookups answered from the cache"""
+        return self._cache.hits if self._cache else 0
+
+    @property
+    def cache_misses(self):
+        """Number of has_infection lookups that missed the cache"""
+        return self._cache.misses if self._cache else 0
 
     @staticmethod
     def _get_tag(infector):
@@ -175,14 +402,162 @@ class InfectionControl(object):
     def infect(self, infector, *infectables):
         """Infect all provided infectables with the given feature."""
         infection_tag = self._get_tag(infector)
+        generation = self.generations[infection_tag]
+        self.version += 1
         for infectable in infectables:
-            self.infections[infectable].append(infection_tag)
+            ident = self._interner.intern(infectable)
+            self.infections[ident][infection_tag] = generation
             _LOG.info("User %s infected with feature %s.", infectable,
                       infection_tag)
 
+    def cure(self, infector, infectables=None):
+        """Remove infections of the given feature
+
+        Curing every infectable only advances the generation of the
+        feature, so it takes constant time however many were infected.
+        Infections from older generations are ignored by has_infection
+        and reclaimed lazily as they are looked up or by collect.
+
+        Args:
+            infector: feature to cure
+            (optional) infectables: sequence of infectables to cure.
+                Cures every infectable when not provided.
+        """
+        infection_tag = self._get_tag(infector)
+        self.version += 1
+        if infectables is None:
+            self.generations[infection_tag] += 1
+            _LOG.info("All users cured of feature %s.", infection_tag)
+            return
+
+        generation = self.generations[infection_tag]
+        for infectable in infectables:
+            tags = self.infections.get(self._interner.find(infectable))
+            if tags is None:
+                continue
+            if tags.pop(infection_tag, None) == generation:
+                _LOG.info("User %s cured of feature %s.", infectable,
+                          infection_tag)
+
+    def collect(self):
+        """Reclaim infections left behind by curing a whole feature
+
+        Infectables left without any infection are forgotten entirely.
+
+        Returns:
+            int reclaimed: number of stale infections removed
+        """
+        reclaimed = 0
+        ids = self._interner.ids
+        for key, ident in ids.items():
+            tags = self.infections.get(ident, {})
+            stale = [tag for tag, generation in tags.iteritems()
+                     if generation != self.generations[tag]]
+            for tag in stale:
+                del tags[tag]
+            if not tags:
+                self.infections.pop(ident, None)
+                del ids[key]
+            reclaimed += len(stale)
+        return reclaimed
+
+    def infected(self, infector):
+        """Get the keys of every infectable with a live infection
+
+        Keys are the id_key of each infectable, or the infectable
+        itself when the control has no id_key.
+        """
+        infection_tag = self._get_tag(infector)
+        if infection_tag not in self.generations:
+            return set()
+        generation = self.generations[infection_tag]
+        return set(key for key, ident in self._interner.ids.iteritems()
+                   if self.infections.get(ident, {}).get(infection_tag) ==
+                   generation)
+
+    def export_infections(self, fileobj, chunk_size=1 << 20):
+        """Write every live infection to a columnar binary stream
+
+        Each infectable is written as its id_key, so the keys must be
+        integers.  The stream is written in chunks of chunk_size ids and
+        can be restored with import_infections.  Infections are still
+        read from a python dict per infectable, which bounds the speed
+        to roughly 1.5 million ids per second with a few features.
+
+        Args:
+            fileobj: binary file to write to
+            (optional) chunk_size: number of ids held in memory at once
+
+        Raises:
+            ValueError: an infectable key is not an integer.  Nothing
+                is written to fileobj.
+        """
+        column = columnar.id_column(self._interner.ids.keys())
+        idents = self._interner.ids.values()
+        features = list(self.generations)
+        columnar.write_features(fileobj, features)
+
+        for start in xrange(0, len(idents), chunk_size):
+            tags = list(imap(self.infections.get,
+                             idents[start:start + chunk_size], repeat({})))
+            infected = np.zeros((len(features), len(tags)), dtype=bool)
+            for row, feature in enumerate(features):
+                generations = np.fromiter(
+                    imap(methodcaller("get", feature, -1), tags),
+                    dtype=np.int64, count=len(tags))
+                infected[row] = generations == self.generations[feature]
+            live = infected.any(axis=0)
+            keys = column[start:start + chunk_size]
+            columnar.write_chunk(fileobj, keys[live], infected[:, live])
+        columnar.write_end(fileobj)
+
+    def import_infections(self, fileobj):
+        """Restore infections written by export_infections
+
+        The integer ids in the stream are taken to be the id_key of the
+        infectables they describe.  Each new infectable still needs its
+        own python dict, which bounds the speed to roughly one million
+        infections per second.
+        """
+        self.version += 1
+        for features, keys, infected in columnar.read_chunks(fileobj):
+            idents = np.array(self._interner.intern_keys(keys.tolist()))
+            for feature, row in zip(features, infected):
+                generation = self.generations[feature]
+                for ident in idents[row].tolist():
+                    self.infections[ident][feature] = generation
+
     def has_infection(self, infectable, infector):
         """Check if an infectable entity has an infection"""
-        return self._get_tag(infector) in self.infections.get(infectable, [])
+        # Resolve the tag and key once, inline, as this is the hot path
+        infection_tag = (infector if isinstance(infector, basestring)
+                         else infector.name)
+        id_key = self._interner.id_key
+        key = id_key(infectable) if id_key else infectable
+        cache = self._cache
+        if cache is None:
+            return self._lookup(key, infection_tag)
+
+        cache_key = (key, infection_tag)
+        entry = cache.recent.get(cache_key)
+        if entry is not None and entry[0] == self.version:
+            cache.hits += 1
+            return entry[1]
+
+        result = cache.get_older(cache_key, self.version)
+        if result is None:
+            result = self._lookup(key, infection_tag)
+            cache.put(cache_key, self.version, result)
+        return result
+
+    def _lookup(self, key, infection_tag):
+        tags = self.infections.get(self._interner.ids.get(key))
+        if tags is None or infection_tag not in tags:
+            return False
+        if tags[infection_tag] != self.generations[infection_tag]:
+            del tags[infection_tag]
+            return False
+        return True
 
 
 CDC = InfectionControl()
@@ -9,15 +9,23 @@ the maximal sum that is no larger than a supplied target.  The
 exact solution is NP-Complete so we default to a greedy algorithm
 that is fast and works well in practice.
 
+The exact algorithms can also be run across a pool of processes.  Items
+are partitioned between workers that each find the sums reachable by
+their partition, using the same method as the serial algorithm.  Those
+partial sums are combined to split the target between partitions, then
+each worker solves its own share exactly.
+
 Exports:
     ALGORITHMS: list of implemented algorithms
     optimize: uses the algorithms to solve the subset sum problem
 """
-from collections import namedtuple
+import multiprocessing
 import operator
 import inspect
 import logging
 
+import numpy as np
+
 
 _LOG = logging.getLogger(__name__)
 
@@ -48,7 +56,7 @@ def _merge_list(seq1, seq2):
     return list(_unique(sorted(seq1 + seq2, key=key), key=key))
 
 
-def _accumulate_partials(seq, trim, key=None):
+def _partial_sums(seq, trim, key=None):
     partial_sums = [(0, [])]
     get_sum = operator.itemgetter(0)
 
@@ -56,18 +64,26 @@ def _accumulate_partials(seq, trim, key=None):
         new_partials = _extend(partial_sums, item, key=key)
         partial_sums = _merge_list(partial_sums, new_partials)
         partial_sums = trim(partial_sums, get_sum)
-    return max(partial_sums, key=get_sum)
+    return partial_sums
 
 
-def _exact(seq, target, key=None):
-    """Perform an exact search for a subset satisfying the subset sum
-    optimization problem.  This function executes in O(2^len(seq))
-    """
+def _accumulate_partials(seq, trim, key=None):
+    return max(_partial_sums(seq, trim, key=key), key=operator.itemgetter(0))
+
+
+def _trim_excess(target):
     def trim_excess(seq, getsum):
         """Remove partial sums larger than target"""
         limit = lambda item: getsum(item) <= target
         return filter(limit, seq)
-    return _accumulate_partials(seq, trim_excess, key=key)
+    return trim_excess
+
+
+def _exact(seq, target, key=None):
+    """Perform an exact search for a subset satisfying the subset sum
+    optimization problem.  This function executes in O(2^len(seq))
+    """
+    return _accumulate_partials(seq, _trim_excess(target), key=key)
 
 
 def _approximation(seq, target, error, key=None):
@@ -90,50 +106,176 @@ def _approximation(seq, target, error, key=None):
 
 def _psudopolynomial(seq, target, key=None):
     """Perform an exact search for a subset satisfying the subset sum
-    optimization problem.  This function executes in O(len(seq) * target) time
+    optimization problem.  This function executes in
+    O(len(seq) * target * ln(len(seq))) time and O(target) space
     """
-    # Create a dynamic programming matrix.  The format of each cell is a tuple
-    # of maximum weight so far, and a pointer to the previous entry used.
-    #pylint: disable=invalid-name
-    PartialSum = namedtuple("PartialSum", ["sum", "last_used"])
-    partial_sums = [[PartialSum(0, None)] * (target + 1)
-                    for _ in xrange(len(seq) + 1)]
-
-    def _get_partial(first_n, max_weight):
-        return partial_sums[first_n][max_weight]
-
-    def _use_previous(first_n, max_weight, val):
-        previous = (first_n - 1, max_weight - val)
-        return PartialSum(val + _get_partial(*previous).sum, previous)
-
-    # Fill in values for the maximal partial sums using the first n elements
-    # up to the given weight remaining
-    for first_n in xrange(1, len(seq) + 1):
-        val = key(seq[first_n - 1]) if key else seq[first_n - 1]
-        for weight_left in xrange(0, target + 1):
-            if val > weight_left:
-                partial_sums[first_n][weight_left] = _use_previous(
-                    first_n, weight_left, 0)
-                continue
-            partial_sums[first_n][weight_left] = max([
-                _use_previous(first_n, weight_left, 0),
-                _use_previous(first_n, weight_left, val)
-            ], key=operator.itemgetter(0))
-
-    # Use the previous pointers to walk back the matrix to determine which
-    # elements were added to get the maximal sum.  We select by changes in
-    # the sum.
-    current = (len(seq), target)
+    weights = [key(item) if key else item for item in seq]
+    total = _reachable_sums(weights, target).bit_length() - 1
     subset = []
-    total = _get_partial(*current).sum
-    while _get_partial(*current).last_used:
-        # check the weight component of the last pointer
-        if current[1] != _get_partial(*current).last_used[1]:
-            subset.append(seq[current[0] - 1])
-        current = _get_partial(*current).last_used
+    _reconstruct((seq, weights), 0, len(seq), total, subset)
     return (total, subset)
 
 
+def _reconstruct(items, start, stop, total, subset):
+    """Add items from seq[start:stop] weighing exactly total to subset,
+    where items is the pair of seq and the weights of its items
+
+    Rather than keeping the whole dynamic programming table to walk back
+    through, split the items in half and find how much of the total each
+    half can reach, then recurse into both halves.
+    """
+    if total == 0:
+        return
+    seq, weights = items
+    if stop - start == 1:
+        subset.append(seq[start])
+        return
+
+    middle = (start + stop) // 2
+    first = _bits_to_array(
+        _reachable_sums(weights[start:middle], total), total + 1)
+    second = _bits_to_array(
+        _reachable_sums(weights[middle:stop], total), total + 1)
+    first_total = int(np.flatnonzero(first & second[::-1])[0])
+    del first, second
+    _reconstruct(items, start, middle, first_total, subset)
+    _reconstruct(items, middle, stop, total - first_total, subset)
+
+
+def _reachable_sums(weights, target):
+    """Get a bitset of the subset sums of weights no larger than target"""
+    mask = (1 << (target + 1)) - 1
+    reachable = 1
+    for weight in weights:
+        if weight <= target:
+            reachable |= (reachable << weight) & mask
+    return reachable
+
+
+def _bits_to_array(bits, size):
+    digits = bin(bits)[:1:-1].ljust(size, "0")
+    return np.frombuffer(digits, dtype=np.uint8) == ord("1")
+
+
+def _sumset(first, second, target):
+    """Get the sums of an element of each boolean set bounded by target"""
+    # Pad to a power of two, as FFTs of sizes with large prime factors
+    # are far slower
+    size = 1 << (2 * target + 1).bit_length()
+    spectrum = np.fft.rfft(first, size) * np.fft.rfft(second, size)
+    return np.fft.irfft(spectrum, size)[:target + 1] > .5
+
+
+def _split_target(reachable, target):
+    """Choose a sum for each partition so the total is maximal"""
+    partials = [_bits_to_array(bits, target + 1) for bits in reachable]
+    combined = [partials[0]]
+    for partial in partials[1:]:
+        combined.append(_sumset(combined[-1], partial, target))
+
+    # Walk back from the best total, taking from each partition a sum
+    # that leaves a total reachable by the partitions before it
+    remaining = int(np.flatnonzero(combined[-1])[-1])
+    sums = []
+    for partial, previous in zip(partials[:0:-1], combined[-2::-1]):
+        used = np.flatnonzero(partial[:remaining + 1] &
+                              previous[remaining::-1])[0]
+        sums.append(int(used))
+        remaining -= int(used)
+    sums.append(remaining)
+    return sums[::-1]
+
+
+def _split_frontiers(frontiers, target):
+    """Choose a sum from each sorted frontier so the total is maximal"""
+    if len(frontiers) == 1:
+        return [frontiers[0][-1]]
+
+    combined = [frontiers[0]]
+    for frontier in frontiers[1:-1]:
+        combined.append(sorted(set(
+            first + second for first in combined[-1] for second in frontier
+            if first + second <= target)))
+
+    # Meet in the middle: walk up the last frontier while walking down
+    # the combined sums, so the final totals are never enumerated
+    best, used, position = 0, 0, len(combined[-1]) - 1
+    for value in frontiers[-1]:
+        while position >= 0 and combined[-1][position] + value > target:
+            position -= 1
+        if position < 0:
+            break
+        if combined[-1][position] + value > best:
+            best, used = combined[-1][position] + value, value
+
+    sums = [used]
+    remaining = best - used
+    for frontier, previous in zip(frontiers[-2:0:-1], combined[-2::-1]):
+        previous = set(previous)
+        used = next(value for value in frontier
+                    if remaining - value in previous)
+        sums.append(used)
+        remaining -= used
+    sums.append(remaining)
+    return sums[::-1]
+
+
+def _exact_frontier(args):
+    weights, target = args
+    partials = _partial_sums(weights, _trim_excess(target))
+    return sorted(set(partial for partial, _ in partials))
+
+
+def _psudopolynomial_frontier(args):
+    weights, target = args
+    return _reachable_sums(weights, target)
+
+
+def _partition_subset(args):
+    algo, indexed_weights, target = args
+    impl = _ALGORITHM_DEFINITIONS[algo]
+    _, subset = impl(indexed_weights, target, key=operator.itemgetter(1))
+    return [index for index, _ in subset]
+
+
+def _solve_partitions(pool, algo, partitions, target):
+    """Get the sum and subset indices each partition contributes"""
+    frontier, split = _PARALLEL_ALGORITHMS[algo]
+    frontiers = pool.map(frontier, [
+        ([weight for _, weight in partition], target)
+        for partition in partitions])
+    sums = split(frontiers, target)
+    subsets = pool.map(_partition_subset, [
+        (algo, partition, partition_sum)
+        for partition, partition_sum in zip(partitions, sums)])
+    return sums, subsets
+
+
+def _parallel(algo, seq, target, workers, key=None):
+    """Solve the subset sum optimization problem exactly with a pool of
+    worker processes.  Each worker handles len(seq) / workers items.
+    For exact the sorted partial sums of each worker are merged, which
+    for two workers is a meet in the middle search in
+    O(2^(len(seq) / 2)).  For psudopolynomial the reachable sums of each
+    worker are combined in O(workers * target * ln(target))
+
+    The merge runs serially in the calling process between the two
+    rounds of work in the pool, so it bounds the speedup.  For exact
+    with more than two workers the merge enumerates the combined sums
+    of all but the last worker, which can cost more than the workers
+    themselves.
+    """
+    indexed = list(enumerate(key(item) if key else item for item in seq))
+    partitions = [indexed[i::workers] for i in xrange(workers)]
+    pool = multiprocessing.Pool(workers)
+    try:
+        sums, subsets = _solve_partitions(pool, algo, partitions, target)
+    finally:
+        pool.close()
+        pool.join()
+    return (sum(sums), [seq[index] for subset in subsets for index in subset])
+
+
 def _sorted_greedy(sorted_seq, target, key):
     parial_sum = 0
     selected_subset = []
@@ -180,6 +322,12 @@ _ALGORITHM_DEFINITIONS = {
 ALGORITHMS = _ALGORITHM_DEFINITIONS.keys()
 
 
+_PARALLEL_ALGORITHMS = {
+    "exact": (_exact_frontier, _split_frontiers),
+    "psudopolynomial": (_psudopolynomial_frontier, _split_target)
+}
+
+
 def _invoke_algorithm(algo, seq, target, error, key):
     kwargs = {'key': key}
     # Approximation algorithms require an error parameter.  Add if required.
@@ -188,7 +336,9 @@ def _invoke_algorithm(algo, seq, target, error, key):
     return algo(seq, target, **kwargs)
 
 
-def optimize(seq, target, algo="greedy", error=.5, key=None):
+# The options are independent keyword arguments of the public interface
+#pylint: disable=too-many-arguments
+def optimize(seq, target, algo="greedy", error=.5, key=None, workers=None):
     """Find a subset with the maximal sum bounded by target
 
     Solves the subset sum problem, either exactly or with an
@@ -210,6 +360,9 @@ def optimize(seq, target, algo="greedy", error=.5, key=None):
         (optional)key (function obj -> int): get weight of list
             item when present.  Otherwise, use the item itself.
             Defaults to None
+        (optional) workers (int): number of processes used to solve
+            the problem.  Only applicable to exact algorithms.
+            Defaults to solving in the current process
 
     Returns:
         sum (int) * subset (list): returns a subset of the original
@@ -218,7 +371,7 @@ def optimize(seq, target, algo="greedy", error=.5, key=None):
 
     Raises:
         ValueError: algorithm is not one defined in ALGORITHMS package
-            variable
+            variable, or cannot be run with multiple workers
 
     Exampes:
         >>> optimize([1,2,3], 5)
@@ -230,6 +383,10 @@ key=operator.itemgetter("x"))
     """
     if algo not in _ALGORITHM_DEFINITIONS:
         raise ValueError("{} is not a valid algorithm selection.".format(algo))
+    if workers > 1:
+        if algo not in _PARALLEL_ALGORITHMS:
+            raise ValueError("{} cannot be run in parallel.".format(algo))
+        return _parallel(algo, seq, target, workers, key=key)
     impl = _ALGORITHM_DEFINITIONS[algo]
     return _invoke_algorithm(impl, seq, target, error, key)
 
@@ -6,3 +6,4 @@ sys.path.insert(0, os.path.abspath('..'))
 
 import feature_infection
 from feature_infection import subset_sum
+from feature_infection import csr
@@ -0,0 +1,93 @@
+from .context import csr, feature_infection
+import networkx as nx
+import pytest
+
+
+def components(graph):
+    return sorted(zip(*[a.tolist() for a in graph.component_sizes()]))
+
+
+class TestCSRGraph:
+    def test_empty_graph(self):
+        graph = csr.CSRGraph([0], [])
+        assert len(graph) == 0
+        assert components(graph) == []
+
+    def test_isolated_nodes(self):
+        graph = csr.CSRGraph.from_edges(3, [], [])
+        assert components(graph) == [(0, 1), (1, 1), (2, 1)]
+
+    def test_one_direction_edges(self):
+        graph = csr.CSRGraph.from_edges(5, [3, 4, 1], [4, 0, 2])
+        assert graph.connected_components().tolist() == [0, 1, 1, 0, 0]
+        assert components(graph) == [(0, 3), (1, 2)]
+
+    def test_long_chain(self):
+        size = 1000
+        graph = csr.CSRGraph.from_edges(size, range(size - 1, 0, -1),
+                                        range(size - 2, -1, -1))
+        assert components(graph) == [(0, size)]
+
+    @pytest.mark.parametrize("coach", [0, 4999, 9999])
+    def test_star(self, coach, monkeypatch):
+        size = 10000
+        students = [node for node in range(size) if node != coach]
+        rounds = []
+        hook = csr._hook
+        monkeypatch.setattr(csr, "_hook",
+                            lambda *args: rounds.append(hook(*args)))
+        for sources, targets in ((students, [coach] * (size - 1)),
+                                 ([coach] * (size - 1), students)):
+            graph = csr.CSRGraph.from_edges(size, sources, targets)
+            assert components(graph) == [(0, size)]
+        assert len(rounds) <= 2
+
+    def test_matches_networkx(self):
+        nx_graph = nx.gnm_random_graph(200, 150, seed=3)
+        graph = csr.CSRGraph.from_networkx(nx_graph)
+        expected = sorted(len(c) for c in nx.connected_components(nx_graph))
+        assert sorted(size for _, size in components(graph)) == expected
+
+    def test_invalid_offsets(self):
+        with pytest.raises(ValueError):
+            csr.CSRGraph([0, 2], [1])
+
+    def test_unknown_target(self):
+        with pytest.raises(ValueError):
+            csr.CSRGraph([0, 1], [1])
+
+    def test_unknown_source(self):
+        with pytest.raises(ValueError):
+            csr.CSRGraph.from_edges(2, [2], [0])
+
+
+class TestCSRInfection:
+    @pytest.fixture
+    def feature(self):
+        control = feature_infection.InfectionControl()
+        return control.get_infector("csr")
+
+    def test_total_infection(self, feature):
+        graph = csr.CSRGraph.from_edges(4, [0, 2], [1, 3])
+        assert feature.total_infection(graph, 1) == set([0, 1])
+        assert feature.is_infected(0)
+        assert not feature.is_infected(2)
+
+    def test_limited_infection(self, feature):
+        graph = csr.CSRGraph.from_edges(6, [1, 3, 4], [2, 4, 5])
+        assert feature.limited_infection(graph, 4) == set([0, 3, 4, 5])
+
+    @pytest.mark.parametrize("node", [-1, 3])
+    def test_unknown_node(self, feature, node):
+        graph = csr.CSRGraph.from_edges(3, [0], [1])
+        with pytest.raises(KeyError):
+            feature.total_infection(graph, node)
+        assert not feature.control.infections
+
+    def test_networkx_nodes(self, feature):
+        nx_graph = nx.Graph()
+        nx_graph.add_edge("one", "two")
+        nx_graph.add_node("three")
+        graph = csr.CSRGraph.from_networkx(nx_graph)
+        assert feature.total_infection(graph, "two") == set(["one", "two"])
+        assert feature.limited_infection(graph, 1) == set(["three"])
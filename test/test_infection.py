@@ -1,3 +1,5 @@
+import io
+import logging
 from .context import feature_infection
 import pytest
 import uuid
@@ -159,3 +161,303 @@ class TestLimitdInfection:
 
         assert not seperate_feature.is_infected(entities[0])
 
+
+
+class TestInfectionCache:
+    def test_repeated_lookup_hits(self):
+        control = feature_infection.InfectionControl(cache_size=10)
+        feature = control.get_infector("cached")
+        entity = Entity()
+        feature.total_infection([entity], entity,
+            connections=Entity.get_connections)
+
+        assert feature.is_infected(entity)
+        assert feature.is_infected(entity)
+        assert (control.cache_hits, control.cache_misses) == (1, 1)
+
+    def test_infection_invalidates_cache(self):
+        control = feature_infection.InfectionControl(cache_size=10)
+        feature = control.get_infector("cached")
+        entity = Entity()
+
+        assert not feature.is_infected(entity)
+        feature.total_infection([entity], entity,
+            connections=Entity.get_connections)
+        assert feature.is_infected(entity)
+        assert control.cache_misses == 2
+
+    def test_bounded_size(self):
+        control = feature_infection.InfectionControl(cache_size=1)
+        feature = control.get_infector("cached")
+        entities = [Entity(), Entity()]
+
+        feature.is_infected(entities[0])
+        feature.is_infected(entities[1])
+        feature.is_infected(entities[0])
+        assert control.cache_hits == 0
+
+    def test_hit_skips_lookup(self, monkeypatch):
+        control = feature_infection.InfectionControl(cache_size=10)
+        control.infect("cached", 1)
+        assert control.has_infection(1, "cached")
+
+        def lookup(*args):
+            raise AssertionError("cache hit fell through to lookup")
+        monkeypatch.setattr(control, "_lookup", lookup)
+
+        assert control.has_infection(1, "cached")
+        assert control.cache_hits == 1
+
+    def test_older_entries_promoted(self):
+        control = feature_infection.InfectionControl(cache_size=4)
+        control.has_infection(0, "cached")
+        for user in range(1, 4):
+            control.has_infection(user, "cached")
+            control.has_infection(0, "cached")
+        assert control.cache_hits == 3
+
+    def test_disabled_by_default(self):
+        control = feature_infection.InfectionControl()
+        feature = control.get_infector("uncached")
+        entity = Entity()
+
+        feature.is_infected(entity)
+        feature.is_infected(entity)
+        assert (control.cache_hits, control.cache_misses) == (0, 0)
+
+
+class TestIdKey:
+    get_id = attrgetter("id")
+
+    def test_plan_returns_original_objects(self, test_feature):
+        entities = [Entity(), Entity(), Entity()]
+        entities[0].connections.append(entities[1])
+        assert test_feature.total_infection(entities, entities[0],
+            connections=Entity.get_connections,
+            id_key=self.get_id) == set(entities[:2])
+
+    def test_limited_infection(self, test_feature):
+        entities = [Entity(), Entity(), Entity()]
+        entities[1].connections.append(entities[2])
+        assert test_feature.limited_infection(entities, 1,
+            connections=Entity.get_connections,
+            id_key=self.get_id) == set([entities[0]])
+
+    def test_control_stores_by_key(self):
+        control = feature_infection.InfectionControl(id_key=self.get_id)
+        feature = control.get_infector("keyed")
+        entity = Entity()
+        copy = Entity()
+        copy.id = entity.id
+
+        feature.total_infection([entity], entity,
+            connections=Entity.get_connections)
+
+        assert feature.is_infected(copy)
+        assert not feature.is_infected(Entity())
+
+    def test_control_keeps_no_infectables(self):
+        control = feature_infection.InfectionControl(id_key=self.get_id)
+        entity = Entity()
+        control.infect("keyed", entity)
+        assert not hasattr(control._interner, "objects")
+        assert control._interner.ids.keys() == [entity.id]
+
+    def test_graph_used_as_given(self, test_feature):
+        import networkx as nx
+        graph = nx.Graph()
+        graph.add_edge("one", "two")
+        planned, _ = test_feature._plan_graph(graph, None, None)
+        assert planned is graph
+
+    def test_graph_input(self, test_feature):
+        import networkx as nx
+        graph = nx.Graph()
+        graph.add_edge("one", "two")
+        graph.add_node("three")
+        assert test_feature.total_infection(graph, "one",
+            id_key=str.upper) == set(["one", "two"])
+
+
+class TestCure:
+    @pytest.fixture
+    def feature(self):
+        return feature_infection.InfectionControl().get_infector("cured")
+
+    def infect(self, feature, entities):
+        for entity in entities:
+            feature.total_infection([entity], entity,
+                connections=Entity.get_connections)
+
+    def test_cure_all(self, feature):
+        entities = [Entity(), Entity()]
+        self.infect(feature, entities)
+
+        feature.cure()
+
+        assert not any(infected(feature, entities))
+
+    def test_cure_some(self, feature):
+        entities = [Entity(), Entity()]
+        self.infect(feature, entities)
+
+        feature.cure(entities[:1])
+
+        assert infected(feature, entities) == [False, True]
+
+    def test_partial_cure_logs_only_infected(self, feature):
+        entities = [Entity(), Entity()]
+        self.infect(feature, entities[:1])
+        feature.cure()
+        self.infect(feature, entities[1:])
+
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        log = logging.getLogger("feature_infection.infection")
+        log.addHandler(handler)
+        log.setLevel(logging.INFO)
+        try:
+            feature.cure(entities)
+        finally:
+            log.removeHandler(handler)
+            log.setLevel(logging.NOTSET)
+
+        cured = [record for record in records
+                 if "cured of feature" in record.getMessage()]
+        assert len(cured) == 1
+        assert not any(infected(feature, entities))
+
+    def test_reinfect_after_cure(self, feature):
+        entities = [Entity()]
+        self.infect(feature, entities)
+        feature.cure()
+        self.infect(feature, entities)
+
+        assert all(infected(feature, entities))
+
+    def test_only_current_feature_cured(self, feature):
+        entities = [Entity()]
+        seperate_feature = feature.control.get_infector("seperate")
+        self.infect(feature, entities)
+        self.infect(seperate_feature, entities)
+
+        feature.cure()
+
+        assert seperate_feature.is_infected(entities[0])
+
+    def test_cure_invalidates_cache(self):
+        control = feature_infection.InfectionControl(cache_size=10)
+        feature = control.get_infector("cured")
+        entities = [Entity()]
+        self.infect(feature, entities)
+
+        assert feature.is_infected(entities[0])
+        feature.cure()
+        assert not feature.is_infected(entities[0])
+
+    def test_infected_lists_live_infections(self, feature):
+        entities = [Entity(), Entity(), Entity()]
+        self.infect(feature, entities)
+        feature.cure(entities[:1])
+
+        assert feature.infected() == set(entities[1:])
+        feature.cure()
+        assert feature.infected() == set()
+
+    def test_infected_uses_id_key(self):
+        control = feature_infection.InfectionControl(id_key=len)
+        control.infect("keyed", "one", "three")
+        assert control.infected("keyed") == set([3, 5])
+        assert control.infected("unknown") == set()
+
+    def test_collect(self, feature):
+        entities = [Entity(), Entity()]
+        self.infect(feature, entities)
+        feature.cure()
+
+        assert feature.control.collect() == 2
+        assert not feature.control.infections
+        assert not feature.control._interner.ids
+
+    def test_collect_forgets_cured_infectables(self, feature):
+        entities = [Entity(), Entity()]
+        self.infect(feature, entities)
+        feature.cure(entities[:1])
+
+        assert feature.control.collect() == 0
+        assert len(feature.control._interner.ids) == 1
+        assert feature.is_infected(entities[1])
+
+
+class TestColumnarExport:
+    def round_trip(self, control, **kwargs):
+        stream = io.BytesIO()
+        control.export_infections(stream, **kwargs)
+        stream.seek(0)
+        restored = feature_infection.InfectionControl()
+        restored.import_infections(stream)
+        return restored
+
+    def test_round_trip(self):
+        control = feature_infection.InfectionControl()
+        control.infect("first", *range(10))
+        control.infect("second", *range(5, 20))
+
+        restored = self.round_trip(control, chunk_size=3)
+
+        for user in range(25):
+            for feature in ("first", "second"):
+                assert (restored.has_infection(user, feature) ==
+                        control.has_infection(user, feature))
+
+    def test_cured_not_exported(self):
+        control = feature_infection.InfectionControl()
+        control.infect("first", 1, 2)
+        control.infect("second", 3)
+        control.cure("first")
+
+        restored = self.round_trip(control)
+
+        assert not restored.has_infection(1, "first")
+        assert restored.has_infection(3, "second")
+        assert list(restored.infections) == [0]
+
+    def test_exports_id_key(self):
+        control = feature_infection.InfectionControl(id_key=len)
+        control.infect("first", "four")
+
+        restored = self.round_trip(control)
+
+        assert restored.has_infection(4, "first")
+
+    def test_empty(self):
+        restored = self.round_trip(feature_infection.InfectionControl())
+        assert not restored.infections
+
+    def test_non_integer_ids(self):
+        control = feature_infection.InfectionControl()
+        control.infect("first", 1, "user")
+        stream = io.BytesIO()
+        with pytest.raises(ValueError):
+            control.export_infections(stream)
+        assert not stream.getvalue()
+
+    def test_non_ascii_feature(self):
+        control = feature_infection.InfectionControl()
+        control.infect("caf\xc3\xa9", 1)
+        control.infect(u"na\xefve", 2)
+
+        restored = self.round_trip(control)
+
+        assert restored.has_infection(1, "caf\xc3\xa9")
+        assert restored.has_infection(2, u"na\xefve")
+        assert set(map(type, restored.generations)) == set([str, unicode])
+
+    def test_non_utf8_feature(self):
+        control = feature_infection.InfectionControl()
+        control.infect("caf\xe9", 1)
+        stream = io.BytesIO()
+        with pytest.raises(UnicodeDecodeError):
+            control.export_infections(stream)
+        assert not stream.getvalue()
@@ -1,5 +1,7 @@
 from .context import subset_sum as ss
+from collections import Counter
 import pytest
+import random
 
 @pytest.fixture(scope="session", params=ss.ALGORITHMS)
 def algo(request):
@@ -41,4 +43,67 @@ class TestSubsetSumAlgorithm:
         seq = [set(["a"]), set(["b", "c"]), set(["d", "e", "f"])]
         target = 5
         res = (5, seq[1:])
-        assert check_result(ss.optimize(seq, target, key=len, algo=algo), res, key=len)
\ No newline at end of file
+        assert check_result(ss.optimize(seq, target, key=len, algo=algo), res, key=len)
+
+@pytest.fixture(params=["exact", "psudopolynomial"])
+def exact_algo(request):
+    return request.param
+
+
+class TestParallel:
+    def test_matches_serial(self, exact_algo):
+        seq = [3, 34, 4, 12, 5, 2, 27, 9]
+        for target in (0, 1, 10, 30, 56, 200):
+            serial = ss.optimize(seq, target, algo=exact_algo)
+            parallel = ss.optimize(seq, target, algo=exact_algo, workers=3)
+            assert parallel[0] == serial[0] == sum(parallel[1])
+
+    def test_more_workers_than_items(self, exact_algo):
+        assert check_result(ss.optimize([2, 3], 4, algo=exact_algo,
+                                        workers=4), (3, [3]))
+
+    def test_empty_set(self, exact_algo):
+        assert check_result(ss.optimize([], 5, algo=exact_algo,
+                                        workers=2), (0, []))
+
+    def test_with_key(self, exact_algo):
+        seq = [set(["a"]), set(["b", "c"]), set(["d", "e", "f"])]
+        res = (5, seq[1:])
+        assert check_result(ss.optimize(seq, 5, key=len, algo=exact_algo,
+                                        workers=2), res, key=len)
+
+    def test_exact_large_target(self):
+        seq = [3000000, 5000000, 7000000, 11000000]
+        assert ss.optimize(seq, 20000000, algo="exact", workers=2)[0] == \
+            ss.optimize(seq, 20000000, algo="exact")[0] == 19000000
+
+    def test_psudopolynomial_large_target(self):
+        # 2 * (10**6 + 1) has the large prime factors 101 and 9901
+        seq = [314159, 271828, 161803, 141421, 173205, 223606]
+        assert ss.optimize(seq, 10**6, algo="psudopolynomial",
+                           workers=2)[0] == \
+            ss.optimize(seq, 10**6, algo="exact")[0]
+
+    def test_approximation_rejected(self):
+        with pytest.raises(ValueError):
+            ss.optimize([1, 2, 3], 5, algo="greedy", workers=2)
+
+
+class TestReconstruct:
+    @pytest.mark.parametrize("seed", range(3))
+    def test_many_levels(self, seed):
+        rand = random.Random(seed)
+        seq = [rand.randint(1, 3000) for _ in xrange(150)]
+        target = 100003
+        optimum = ss._reachable_sums(seq, target).bit_length() - 1
+        subset = []
+        ss._reconstruct((seq, seq), 0, len(seq), optimum, subset)
+        assert sum(subset) == optimum
+        assert not Counter(subset) - Counter(seq)
+
+    def test_unreachable_target(self):
+        rand = random.Random(0)
+        seq = [rand.randrange(2, 2000, 2) for _ in xrange(120)]
+        total, subset = ss.optimize(seq, 99999, algo="psudopolynomial")
+        assert total == sum(subset) == 99998
+        assert not Counter(subset) - Counter(seq)